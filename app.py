@@ -1,20 +1,21 @@
-import os
+import asyncio
+import hashlib
 import streamlit as st
-from src.genai_core import (
-    process_paper_content, 
-    generate_key_topics, 
-    generate_hypotheses, 
-    generate_future_work
-)
+from src.genai_core import aclose_http_clients, aprocess_paper_content, astream_analysis
+from src.genai_core_batch import submit_batch, poll_and_fetch
+from src.pdf_utils import extract_pdf_text
 from pyvis.network import Network
 import streamlit.components.v1 as components
-import tempfile
-import shutil
-import io
-import PyPDF2
 
-# Initialize empty graph data for visualization
-initial_graph_data = {"nodes": [], "relationships": []}
+# Node colors by entity type
+NODE_COLORS = {
+    "Person": "#DAF7A6",
+    "Concept": "#FF5733",
+    "Organization": "#C70039",
+    "Method": "#900C3F",
+    "Field": "#581845",
+}
+DEFAULT_NODE_COLOR = "#FFC300"
 
 st.set_page_config(page_title="AI Research Graph Project", layout="wide")
 
@@ -38,98 +39,149 @@ paper_content = st.text_area(
     help="Copy and paste the raw text content of a research paper.",
 )
 
+@st.cache_data(show_spinner=False)
+def load_pdf_text(file_digest: str, _pdf_file):
+    """
+    Extracts PDF text once per distinct file, so reruns on the same upload are free.
+    Cached on `file_digest` only; the underscore keeps Streamlit from hashing the file.
+    """
+    _pdf_file.seek(0)
+    return extract_pdf_text(_pdf_file)
+
 processed_text = ""
 if uploaded_file is not None:
-    # To read file as bytes:
-    bytes_data = uploaded_file.getvalue()
     try:
-        # Create a PDF reader object
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(bytes_data))
-        num_pages = len(pdf_reader.pages)
-        for page_num in range(num_pages):
-            page = pdf_reader.pages[page_num]
-            processed_text += page.extract_text() or ""
+        # Hash and parse the upload in place rather than copying its bytes out first
+        file_digest = hashlib.file_digest(uploaded_file, "blake2b").hexdigest()
+        processed_text, num_pages, skipped_pages = load_pdf_text(file_digest, uploaded_file)
         st.success(f"Successfully extracted text from {num_pages} pages of the PDF.")
+        if skipped_pages:
+            st.info(f"Skipped {skipped_pages} image-only pages with no extractable text.")
     except Exception as e:
         st.error(f"Error extracting text from PDF: {e}")
         processed_text = ""
 elif paper_content:
     processed_text = paper_content
 
+def create_result_tabs():
+    """Creates the result tabs. Returns the graph tab and a placeholder per analysis section."""
+    graph_tab, key_topics_tab, hypotheses_tab, future_work_tab = st.tabs(
+        ["Knowledge Graph", "Key Topics & Methods", "Hypotheses & Ideas", "Future Work"]
+    )
+    with graph_tab:
+        st.subheader("Knowledge Graph")
+
+    placeholders = {}
+    for key, tab, title in [
+        ("key_topics", key_topics_tab, "Key Topics and Methodologies"),
+        ("hypotheses", hypotheses_tab, "Generated Hypotheses and Research Ideas"),
+        ("future_work", future_work_tab, "Suggested Future Work"),
+    ]:
+        with tab:
+            st.subheader(title)
+            placeholders[key] = st.empty()
+    return graph_tab, placeholders
+
+def render_graph(extracted_data):
+    """Renders the extracted entities and relations as an interactive PyVis graph."""
+    if extracted_data["entities"]:
+        # Create a PyVis network
+        net = Network(height="750px", width="100%", bgcolor="#222222", font_color="white", directed=True)
+
+        # Add nodes
+        for node in extracted_data["entities"]:
+            node_id = node["name"]
+            node_label = node["name"]
+            node_title = node["type"]
+            node_color = NODE_COLORS.get(node["type"], DEFAULT_NODE_COLOR)
+            net.add_node(node_id, label=node_label, title=node_title, color=node_color, size=20)
+
+        # Add edges
+        for edge in extracted_data["relations"]:
+            net.add_edge(edge["source"], edge["target"], title=edge["type"], label=edge["type"], width=2)
+
+        # Generate and display the graph
+        try:
+            html_content = net.generate_html(notebook=False)
+            components.html(html_content, height=760)
+        except Exception as e:
+            st.error(f"Error generating graph visualization: {e}")
+    else:
+        st.warning("Could not extract any entities or relations to build the graph.")
+
+def render_results(extracted_data, analysis):
+    """Renders the knowledge graph and the textual analysis into result tabs."""
+    graph_tab, placeholders = create_result_tabs()
+    with graph_tab:
+        render_graph(extracted_data)
+    for key, placeholder in placeholders.items():
+        placeholder.markdown(analysis[key])
+
+async def stream_results(text: str):
+    """
+    Extracts the graph while streaming the analysis into its tabs as tokens arrive,
+    so the first sections show up long before the whole response is complete.
+    """
+    graph_tab, placeholders = create_result_tabs()
+    with graph_tab:
+        graph_container = st.empty()
+        graph_container.info("Extracting entities and relations to build the knowledge graph...")
+
+    try:
+        # Graph extraction and the textual analysis are independent, so run them concurrently
+        graph_task = asyncio.create_task(aprocess_paper_content(text))
+        rendered = {}
+        async for analysis in astream_analysis(text):
+            # Only sections whose text changed are sent to the browser again
+            for key, placeholder in placeholders.items():
+                if analysis[key] != rendered.get(key):
+                    placeholder.markdown(analysis[key])
+                    rendered[key] = analysis[key]
+
+        extracted_data = await graph_task
+    finally:
+        # This run's event loop ends with asyncio.run, so close its connections with it
+        await aclose_http_clients()
+    with graph_container.container():
+        render_graph(extracted_data)
+
+
+batch_mode = st.sidebar.toggle(
+    "Batch mode (cheap, async)",
+    help="Submit the paper to the Batch API at about half the price. Results can take up to 24 hours.",
+)
+
 if st.button("Process Paper"):
     if processed_text:
-        st.header("2. Analysis Results")
-        
-        # Create tabs
-        tab1, tab2, tab3, tab4 = st.tabs(["Knowledge Graph", "Key Topics & Methods", "Hypotheses & Ideas", "Future Work"])
-
-        with tab1:
-            st.subheader("Knowledge Graph")
-            with st.spinner("Extracting entities and relations to build the knowledge graph..."):
-                extracted_data = process_paper_content(processed_text)
-            
-            if extracted_data["entities"]:
-                # Create a PyVis network
-                net = Network(height="750px", width="100%", bgcolor="#222222", font_color="white", directed=True)
-                
-                # Add nodes
-                for node in extracted_data["entities"]:
-                    node_id = node["name"]
-                    node_label = node["name"]
-                    node_title = node["type"]
-                    node_color = "#FFC300" # Default color
-
-                    if "Person" == node["type"]:
-                        node_color = "#DAF7A6"
-                    elif "Concept" == node["type"]:
-                        node_color = "#FF5733"
-                    elif "Organization" == node["type"]:
-                        node_color = "#C70039"
-                    elif "Method" == node["type"]:
-                        node_color = "#900C3F"
-                    elif "Field" == node["type"]:
-                        node_color = "#581845"
-
-                    net.add_node(node_id, label=node_label, title=node_title, color=node_color, size=20)
-                
-                # Add edges
-                for edge in extracted_data["relations"]:
-                    net.add_edge(edge["source"], edge["target"], title=edge["type"], label=edge["type"], width=2)
-
-                # Generate and display the graph
-                try:
-                    with tempfile.TemporaryDirectory() as tmpdir:
-                        html_file = os.path.join(tmpdir, "kg_graph.html")
-                        net.save_graph(html_file)
-                        with open(html_file, "r", encoding="utf-8") as f:
-                            html_content = f.read()
-                        components.html(html_content, height=760)
-                except Exception as e:
-                    st.error(f"Error generating graph visualization: {e}")
-            else:
-                st.warning("Could not extract any entities or relations to build the graph.")
-        
-        with tab2:
-            st.subheader("Key Topics and Methodologies")
-            with st.spinner("Generating summary of key topics and methodologies..."):
-                key_topics_md = generate_key_topics(processed_text)
-            st.markdown(key_topics_md)
-            
-        with tab3:
-            st.subheader("Generated Hypotheses and Research Ideas")
-            with st.spinner("Generating novel hypotheses and research ideas..."):
-                hypotheses_md = generate_hypotheses(processed_text)
-            st.markdown(hypotheses_md)
-
-        with tab4:
-            st.subheader("Suggested Future Work")
-            with st.spinner("Generating suggestions for future work..."):
-                future_work_md = generate_future_work(processed_text)
-            st.markdown(future_work_md)
-
+        if batch_mode:
+            try:
+                st.session_state["batch_id"] = submit_batch([processed_text])
+                st.success(
+                    f"Submitted batch `{st.session_state['batch_id']}`. "
+                    "Use 'Fetch Batch Results' in the sidebar once it has completed."
+                )
+            except Exception as e:
+                st.error(f"Error submitting batch: {e}")
+        else:
+            st.header("2. Analysis Results")
+            asyncio.run(stream_results(processed_text))
     else:
         st.warning("Please upload a PDF or paste some research paper content to process.")
 
+if batch_mode:
+    batch_id = st.sidebar.text_input("Batch ID", value=st.session_state.get("batch_id", ""))
+    if st.sidebar.button("Fetch Batch Results") and batch_id:
+        try:
+            with st.spinner("Fetching batch results..."):
+                batch_results = poll_and_fetch(batch_id)
+            if batch_results is None:
+                st.info(f"Batch `{batch_id}` is still running. Check back later.")
+            else:
+                st.header("2. Analysis Results")
+                render_results(*batch_results[0])
+        except Exception as e:
+            st.error(f"Error fetching batch results: {e}")
+
 st.sidebar.header("About")
 st.sidebar.info(
     "This is a prototype for the AI Research Graph Project. "
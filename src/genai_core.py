@@ -1,72 +1,543 @@
 # src/genai_core.py
+import asyncio
+import hashlib
+import shelve
+import threading
 import time
+from functools import lru_cache
 import os
+import httpx
+import openai
+import orjson
+from datasketch import MinHash, MinHashLSH
 from dotenv import load_dotenv
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, Iterator, List, Any, Tuple
 
 load_dotenv() # Call load_dotenv() here to ensure variables are loaded
 
 # For Langchain integration
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
-from pydantic import BaseModel, Field
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.json import parse_json_markdown
+from pydantic import BaseModel, ConfigDict, Field
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 
 # Set OPENAI_API_KEY for compatibility with underlying openai client
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENROUTER_API_KEY")
 
+MODEL_NAME = "nvidia/nemotron-3-nano-30b-a3b:free"
+# Graph extraction is plain structured NER, so it can be routed to a smaller, faster
+# model than the analysis. Defaults to the same free model (a 3B-active MoE).
+EXTRACTION_MODEL_NAME = os.getenv("EXTRACTION_MODEL_NAME", MODEL_NAME)
+
+# Sized to cover every concurrent extraction, the analysis stream and the embeddings
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+
+# One pooled HTTP/2 client shared by every OpenRouter call, so the TCP+TLS connection
+# stays warm across analyses and Streamlit sessions instead of being re-established
+http_client = httpx.Client(http2=True, limits=HTTP_LIMITS)
+
+
+class _LoopLocalAsyncClient(httpx.AsyncClient):
+    """
+    Async client that sends every request through a pooled HTTP/2 client of the running
+    event loop. Async connections are bound to the loop that opened them, and the app
+    runs each analysis in a fresh loop via `asyncio.run`, so a single shared pool fails
+    with "Event loop is closed" on reuse. Within one run, concurrent requests share the
+    loop's connection; `aclose_http_clients` closes it before the loop ends.
+    This client itself only builds requests, with the same settings as the per-loop
+    clients; its own pool is never opened, so there is nothing of it to close.
+    """
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._client_kwargs = kwargs
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                # A loop that ended without closing its pool can no longer close it
+                for closed_loop in [l for l in self._clients if l.is_closed()]:
+                    del self._clients[closed_loop]
+                # No custom transport, so HTTPS_PROXY/NO_PROXY apply just as for `http_client`
+                client = self._clients[loop] = httpx.AsyncClient(**self._client_kwargs)
+            return client
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await self._get_client().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        """Closes the running loop's pool, if it opened one; later loops get their own."""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+http_async_client = _LoopLocalAsyncClient(http2=True, limits=HTTP_LIMITS)
+
+async def aclose_http_clients() -> None:
+    """Closes the connections opened in the running event loop. Call before it ends."""
+    await http_async_client.aclose()
+
 # Initialize the LLM (OpenRouter with Llama 3.1 8B Instruct)
 llm = ChatOpenAI(
     api_key=os.getenv("OPENROUTER_API_KEY"), # Explicitly pass the API key
     base_url="https://openrouter.ai/api/v1", # Use base_url for non-OpenAI endpoints
-    model_name="nvidia/nemotron-3-nano-30b-a3b:free",
-    temperature=0.6
+    model_name=MODEL_NAME,
+    temperature=0.6,
+    streaming=True, # The analysis is rendered token by token
+    http_client=http_client,
+    http_async_client=http_async_client,
 )
 
-# Initialize Embeddings model via OpenRouter
-embeddings = OpenAIEmbeddings(
+# Output tokens dominate per-chunk cost and latency, so extraction responses are capped
+EXTRACTION_MAX_TOKENS = 1500
+
+# Deterministic decoding for extraction improves schema adherence, so fewer retries
+extraction_llm = ChatOpenAI(
     api_key=os.getenv("OPENROUTER_API_KEY"),
     base_url="https://openrouter.ai/api/v1",
-    model="openai/text-embedding-3-small", # A valid and common embedding model on OpenRouter
+    model_name=EXTRACTION_MODEL_NAME,
+    temperature=0,
+    max_tokens=EXTRACTION_MAX_TOKENS,
+    http_client=http_client,
+    http_async_client=http_async_client,
+)
+
+# Upper bound on concurrent OpenRouter requests, to stay clear of rate limits
+MAX_CONCURRENT_REQUESTS = 4
+
+# --- RESPONSE CACHE ---
+
+# Bump whenever a prompt or the shape of a cached response changes,
+# so stale cached responses are not reused
+PROMPT_VERSION = 6
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache")
+_cache_lock = threading.Lock()
+
+# Model that answers each cached task, where it is not MODEL_NAME
+_TASK_MODELS = {"graph": EXTRACTION_MODEL_NAME}
+
+def _cache_key(task: str, content: str) -> str:
+    """Builds a content-addressed key, so the full text is never used as a key itself."""
+    content_hash = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{_TASK_MODELS.get(task, MODEL_NAME)}:{PROMPT_VERSION}:{task}:{content_hash}"
+
+def _cache_get(key: str) -> Any:
+    with _cache_lock, shelve.open(LLM_CACHE_PATH) as cache:
+        return cache.get(key)
+
+def _cache_set(key: str, value: Any) -> None:
+    with _cache_lock, shelve.open(LLM_CACHE_PATH) as cache:
+        cache[key] = value
+
+def _cache_get_many(keys: List[str]) -> List[Any]:
+    """Looks up every key with a single open of the cache file."""
+    with _cache_lock, shelve.open(LLM_CACHE_PATH) as cache:
+        return [cache.get(key) for key in keys]
+
+def _cache_set_many(items: Dict[str, Any]) -> None:
+    with _cache_lock, shelve.open(LLM_CACHE_PATH) as cache:
+        cache.update(items)
+
+def _invoke_cached(task: str, chain, content: str) -> Any:
+    """Invokes `chain` on `content`, reusing the stored response for identical input."""
+    key = _cache_key(task, content)
+    result = _cache_get(key)
+    if result is None:
+        # Exceptions propagate before anything is stored, so failures are never cached
+        result = chain.invoke({"text": content})
+        _cache_set(key, result)
+    return result
+
+async def _ainvoke_cached(task: str, chain, content: str) -> Any:
+    """Async variant of `_invoke_cached`. Cache file I/O runs in a worker thread."""
+    key = _cache_key(task, content)
+    result = await asyncio.to_thread(_cache_get, key)
+    if result is None:
+        result = await chain.ainvoke({"text": content})
+        await asyncio.to_thread(_cache_set, key, result)
+    return result
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model so each distinct text is only ever embedded once,
+    sharing the on-disk response cache. Only texts not already stored are sent.
+    """
+
+    def __init__(self, underlying: Embeddings, namespace: str):
+        self.underlying = underlying
+        self.namespace = namespace
+
+    def _key(self, text: str) -> str:
+        text_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{self.namespace}:embedding:{text_hash}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = _cache_get_many(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self.underlying.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            _cache_set_many({keys[i]: vectors[i] for i in missing})
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are short and rarely repeated, so they are not worth caching
+        return self.underlying.embed_query(text)
+
+
+# Initialize Embeddings model via OpenRouter
+EMBEDDING_MODEL_NAME = "openai/text-embedding-3-small" # A valid and common embedding model on OpenRouter
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(
+        api_key=os.getenv("OPENROUTER_API_KEY"),
+        base_url="https://openrouter.ai/api/v1",
+        model=EMBEDDING_MODEL_NAME,
+        chunk_size=256, # Texts per request, so a whole paper is embedded in one round-trip
+        http_client=http_client,
+        http_async_client=http_async_client,
+    ),
+    namespace=EMBEDDING_MODEL_NAME,
 )
 
+def _batch_cached(task: str, chain, contents: List[str]) -> List[Any]:
+    """
+    Runs `chain` over every item in `contents` concurrently, serving stored responses
+    from the cache. Items that fail are returned as their exception rather than raised.
+    """
+    keys = [_cache_key(task, content) for content in contents]
+    results = _cache_get_many(keys)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        fresh = chain.batch(
+            [{"text": contents[i]} for i in missing],
+            config={"max_concurrency": MAX_CONCURRENT_REQUESTS},
+            return_exceptions=True,
+        )
+        for i, result in zip(missing, fresh):
+            results[i] = result
+        _cache_set_many({keys[i]: results[i] for i in missing if not isinstance(results[i], Exception)})
+    return results
+
+async def _abatch_cached_as_completed(task: str, chain, contents: List[str]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Async variant of `_batch_cached` that yields (index, result) pairs as soon as each
+    one is available: stored responses first, then fresh ones in completion order.
+    Cache file I/O runs in a worker thread, so it never blocks the event loop.
+    """
+    keys = [_cache_key(task, content) for content in contents]
+    missing = []
+    for i, result in enumerate(await asyncio.to_thread(_cache_get_many, keys)):
+        if result is None:
+            missing.append(i)
+        else:
+            yield i, result
+    if missing:
+        async for j, result in chain.abatch_as_completed(
+            [{"text": contents[i]} for i in missing],
+            config={"max_concurrency": MAX_CONCURRENT_REQUESTS},
+            return_exceptions=True,
+        ):
+            i = missing[j]
+            if not isinstance(result, Exception):
+                await asyncio.to_thread(_cache_set, keys[i], result)
+            yield i, result
+
+def _stream_cached(task: str, chain, content: str) -> Iterator[str]:
+    """Streams `chain` on `content`; a stored response is yielded in one piece."""
+    key = _cache_key(task, content)
+    cached = _cache_get(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for part in chain.stream({"text": content}):
+        parts.append(part)
+        yield part
+    # Reached only once the response has been streamed in full
+    _cache_set(key, "".join(parts))
+
+async def _astream_cached(task: str, chain, content: str) -> AsyncIterator[str]:
+    """Async variant of `_stream_cached`. Cache file I/O runs in a worker thread."""
+    key = _cache_key(task, content)
+    cached = await asyncio.to_thread(_cache_get, key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    async for part in chain.astream({"text": content}):
+        parts.append(part)
+        yield part
+    # Reached only once the response has been streamed in full
+    await asyncio.to_thread(_cache_set, key, "".join(parts))
+
 # --- GRAPH EXTRACTION ---
 
-# Define output schema for Langchain
+# Define output schema for Langchain. Extra keys are forbidden, as strict
+# structured outputs require `additionalProperties: false` on every object.
 class Entity(BaseModel):
+    model_config = ConfigDict(extra="forbid")
     name: str = Field(description="Name of the entity")
     type: str = Field(description="Type of the entity (e.g., Person, Organization, Concept, Method, Field)")
 
 class Relation(BaseModel):
+    model_config = ConfigDict(extra="forbid")
     source: str = Field(description="Name of the source entity")
     target: str = Field(description="Name of the target entity")
     type: str = Field(description="Type of the relationship (e.g., DISCUSSES, USES, CONTAINS, RELATED_TO)")
 
 class Extraction(BaseModel):
+    model_config = ConfigDict(extra="forbid")
     entities: List[Entity] = Field(description="List of extracted entities")
     relations: List[Relation] = Field(description="List of extracted relations")
 
-# Use PydanticOutputParser for better type safety and error handling
-graph_parser = PydanticOutputParser(pydantic_object=Extraction)
+# Constrain decoding to the Extraction schema server-side. Not every OpenRouter
+# provider honours it, so the prompt still carries a compact JSON skeleton and
+# responses are still checked by `parse_extraction`.
+GRAPH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "Extraction", "strict": True, "schema": Extraction.model_json_schema()},
+}
+
+
+class InvalidExtractionError(ValueError):
+    """Raised when an extraction response does not have the Extraction shape."""
+
+
+def _is_entity(e: Any) -> bool:
+    return isinstance(e, dict) and all(isinstance(e.get(key), str) for key in ("name", "type"))
+
+
+def _is_relation(r: Any) -> bool:
+    return isinstance(r, dict) and all(isinstance(r.get(key), str) for key in ("source", "target", "type"))
+
+
+def _decode_json(text: str) -> Any:
+    """
+    Decodes a JSON response. Providers that ignore `response_format` tend to wrap the
+    JSON in a ```json fence or in prose, so those shapes are unwrapped on a failed parse.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        return parse_json_markdown(text)
+    except ValueError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        try:
+            return orjson.loads(text[start:end + 1])
+        except orjson.JSONDecodeError:
+            pass
+    raise InvalidExtractionError("Response does not contain a valid JSON object.")
+
+
+def parse_extraction(text: str) -> Dict[str, List[Any]]:
+    """
+    Decodes an extraction response straight into plain dicts, the shape the rest of
+    the pipeline uses, after a minimal check of that shape rather than a full Pydantic
+    validation. Raises InvalidExtractionError for a malformed response, so that inside
+    the chain it is never cached.
+    """
+    if not isinstance(text, str):
+        # e.g. None when the model refused
+        raise InvalidExtractionError("Response has no text content.")
+    extraction = _decode_json(text)
+    if not isinstance(extraction, dict):
+        raise InvalidExtractionError("Response is not a JSON object.")
+    entities, relations = extraction.get("entities"), extraction.get("relations")
+    if not isinstance(entities, list) or not isinstance(relations, list):
+        raise InvalidExtractionError("Response lacks 'entities' and 'relations' lists.")
+    if not all(map(_is_entity, entities)) or not all(map(_is_relation, relations)):
+        raise InvalidExtractionError("Response has entities or relations with missing or non-string keys.")
+    return {"entities": entities, "relations": relations}
+
+
+def _parse_extraction_message(message: AIMessage) -> Dict[str, List[Any]]:
+    return parse_extraction(message.content)
+
+
+graph_llm = extraction_llm.bind(response_format=GRAPH_RESPONSE_FORMAT) | RunnableLambda(_parse_extraction_message)
 
 # Define the prompt for entity and relation extraction
 graph_prompt = ChatPromptTemplate.from_messages(
     [
-        ("system", """You are an expert at extracting entities and relations from scientific texts.
-         Extract all relevant entities and their types, and relationships between them and their types.
-         Be comprehensive. For every relation you extract, ensure that both the source and target entities are also present in the extracted entities list.
-         Your output MUST be a JSON object.
-         Entity types should be chosen from: Person, Organization, Concept, Method, Field.
-         Relation types should be chosen from: DISCUSSES, USES, CONTAINS, RELATED_TO, DEVELOPS, INVESTIGATES, FINDS, INTRODUCES, PROPOSES, COMPARES_TO, PART_OF, APPLIES_TO, AUTHORED_BY, AFFILIATED_WITH.
-         
-         Format your output as a JSON object with 'entities' and 'relations' keys, following this schema:
-         {format_instructions}
-         """),
-        ("human", "Extract entities and relations from the following text:\n\n{text}"),
+        ("system", "Extract the key entities and the relations between them from a scientific text. "
+         "Keep the most important: at most 30 entities and 40 relations. "
+         "Every relation's source and target must also be listed as entities.\n"
+         "Entity types: Person, Organization, Concept, Method, Field.\n"
+         "Relation types: DISCUSSES, USES, CONTAINS, RELATED_TO, DEVELOPS, INVESTIGATES, FINDS, INTRODUCES, "
+         "PROPOSES, COMPARES_TO, PART_OF, APPLIES_TO, AUTHORED_BY, AFFILIATED_WITH.\n"
+         "Reply with only this JSON object:\n"
+         '{{"entities":[{{"name":"","type":""}}],"relations":[{{"source":"","target":"","type":""}}]}}'),
+        ("human", "{text}"),
     ]
-).partial(format_instructions=graph_parser.get_format_instructions())
+)
+
+# Only transient API errors are retried. At temperature 0 the same request returns
+# the same output, so a malformed response (InvalidExtractionError) or one cut off at
+# EXTRACTION_MAX_TOKENS (openai.LengthFinishReasonError) fails the chunk at once.
+RETRYABLE_EXTRACTION_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Built once at import. The retry wraps the LLM step rather than the whole chain:
+# RunnableRetry does not implement abatch_as_completed, so a retrying outer chain
+# would silently never retry there.
+graph_chain = graph_prompt | graph_llm.with_retry(
+    retry_if_exception_type=RETRYABLE_EXTRACTION_ERRORS, stop_after_attempt=3
+)
+
+
+# Chunks whose estimated Jaccard similarity to an earlier chunk reaches this are skipped
+NEAR_DUPLICATE_THRESHOLD = 0.85
+_MINHASH_PERMUTATIONS = 128
+_SHINGLE_SIZE = 5
+
+
+def _drop_near_duplicates(chunks: List[str]) -> List[str]:
+    """
+    Skips chunks that repeat an earlier one almost verbatim (e.g. an abstract restated
+    in the introduction), using MinHash signatures over character shingles. Costs
+    milliseconds per chunk, against seconds for the LLM call it saves. LSH only finds
+    candidates, which include less similar pairs too, so each one is checked against
+    the threshold before a chunk is dropped.
+    """
+    lsh = MinHashLSH(threshold=NEAR_DUPLICATE_THRESHOLD, num_perm=_MINHASH_PERMUTATIONS)
+    signatures: Dict[str, MinHash] = {}
+    unique_chunks = []
+    for i, chunk in enumerate(chunks):
+        text = " ".join(chunk.lower().split())
+        shingles = {text[j:j + _SHINGLE_SIZE] for j in range(max(len(text) - _SHINGLE_SIZE + 1, 1))}
+        signature = MinHash(num_perm=_MINHASH_PERMUTATIONS)
+        signature.update_batch([shingle.encode("utf-8") for shingle in shingles])
+        if any(signature.jaccard(signatures[key]) >= NEAR_DUPLICATE_THRESHOLD for key in lsh.query(signature)):
+            continue
+        signatures[str(i)] = signature
+        lsh.insert(str(i), signature)
+        unique_chunks.append(chunk)
+    if len(unique_chunks) < len(chunks):
+        print(f"Skipped {len(chunks) - len(unique_chunks)} near-duplicate chunks.")
+    return unique_chunks
+
+
+# Chunks are measured in tokens, not characters, so each one uses the same share of the
+# context budget however dense the text is. cl100k_base approximates the model's tokenizer.
+CHUNK_ENCODING = "cl100k_base"
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 100
+
+
+@lru_cache(maxsize=1)
+def _get_text_splitter() -> RecursiveCharacterTextSplitter:
+    # Built on first use, since loading the encoding may need to download it
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=CHUNK_ENCODING, chunk_size=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS
+    )
+
+
+def split_into_chunks(content: str) -> List[str]:
+    """
+    Splits the whole paper into overlapping chunks that each fit comfortably in the
+    model's context window, so later sections are extracted rather than truncated.
+    Near-duplicate chunks are dropped, since they would only yield the same graph.
+    """
+    return _drop_near_duplicates(_get_text_splitter().split_text(content))
+
+
+def build_vectorstore(chunks: List[str]) -> FAISS:
+    """
+    Embeds the chunks into a FAISS index for similarity search. Graph extraction does
+    not need it, so it is only built when retrieval is actually requested.
+    """
+    if not chunks:
+        raise ValueError("build_vectorstore needs at least one chunk to index.")
+    print("Creating vector store from document chunks...")
+    # Embed every chunk in one batched call, then build the index from the vectors
+    vectors = embeddings.embed_documents(chunks)
+    vectorstore = FAISS.from_embeddings(list(zip(chunks, vectors)), embeddings)
+    print("Vector store created.")
+    return vectorstore
+
+
+class _GraphMerger:
+    """
+    De-duplicates per-chunk extractions into a single graph, one chunk at a time, so
+    chunks can be merged in whatever order they complete. An entity keeps the type
+    from the earliest chunk that names it, which makes the result order-independent.
+    """
+
+    def __init__(self):
+        self.entities: Dict[str, Tuple[int, Dict[str, str]]] = {}
+        self.relations: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+
+    def add(self, chunk_index: int, extraction: Any) -> None:
+        """
+        Merges one chunk's result. Failed chunks arrive as exceptions and are skipped,
+        as are malformed entities and relations, without affecting the rest.
+        """
+        if isinstance(extraction, Exception):
+            print(f"    - Warning: Could not process chunk {chunk_index+1} for graph extraction. Error: {extraction}")
+            return
+        if not isinstance(extraction, dict):
+            print(f"    - Warning: Skipping chunk {chunk_index+1}: extraction is not a JSON object.")
+            return
+        skipped = 0
+        for e in extraction.get("entities") or []:
+            if not _is_entity(e):
+                skipped += 1
+                continue
+            seen = self.entities.get(e["name"])
+            if seen is None or chunk_index < seen[0]:
+                self.entities[e["name"]] = (chunk_index, e)
+        for r in extraction.get("relations") or []:
+            if not _is_relation(r):
+                skipped += 1
+                continue
+            self.relations[(r["source"], r["target"], r["type"])] = r
+        if skipped:
+            print(f"    - Warning: Skipped {skipped} malformed entities or relations in chunk {chunk_index+1}.")
+
+    def result(self) -> Dict[str, List[Any]]:
+        unique_entities_dict = {name: e for name, (_, e) in self.entities.items()}
+        # Relation endpoints no chunk listed as entities are added as Concepts,
+        # so every edge has both of its nodes
+        for r in self.relations.values():
+            unique_entities_dict.setdefault(r["source"], {"name": r["source"], "type": "Concept"})
+            unique_entities_dict.setdefault(r["target"], {"name": r["target"], "type": "Concept"})
+        return {"entities": list(unique_entities_dict.values()), "relations": list(self.relations.values())}
+
+
+def merge_extractions(all_entities: List[Dict[str, str]], all_relations: List[Dict[str, str]]) -> Dict[str, List[Any]]:
+    """De-duplicates already collected extractions into a single graph."""
+    merger = _GraphMerger()
+    merger.add(0, {"entities": all_entities, "relations": all_relations})
+    return merger.result()
+
+
+def _error_graph() -> Dict[str, List[Any]]:
+    """Placeholder graph shown when extraction fails outright."""
+    return {
+        "entities": [{"name": "Error", "type": "Processing Failed"}],
+        "relations": [{"source": "Document Processing", "target": "Error", "type": "ENCOUNTERED"}]
+    }
 
 
 def process_paper_content(content: str) -> Dict[str, List[Any]]:
@@ -77,132 +548,194 @@ def process_paper_content(content: str) -> Dict[str, List[Any]]:
     """
     try:
         # 1. Chunking
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-        chunks = text_splitter.split_text(content)
-        chunks = chunks[:5] # Limit to first 5 chunks
-
-        # 2. Create Vector Store (as requested by user)
-        print("Creating vector store from document chunks...")
-        vectorstore = FAISS.from_texts(texts=chunks, embedding=embeddings)
-        print("Vector store created.")
-
-        # 3. Process chunks and extract graph data
-        all_entities = []
-        all_relations = []
-        
-        # Create a chain with retry logic for robustness against parsing errors
-        chain = graph_prompt | llm | graph_parser
-        chain_with_retry = chain.with_retry(
-            stop_after_attempt=3
-        )
+        chunks = split_into_chunks(content)
 
+        # 2. Process all chunks concurrently and extract graph data
         print(f"Processing {len(chunks)} chunks for graph extraction...")
-        for i, chunk in enumerate(chunks):
-            print(f"  - Processing chunk {i+1}/{len(chunks)}")
-            try:
-                # Invoke the chain with retry
-                extracted_chunk_data = chain_with_retry.invoke({"text": chunk})
-                
-                # The PydanticOutputParser returns a Pydantic 'Extraction' object directly
-                if extracted_chunk_data and extracted_chunk_data.entities:
-                    all_entities.extend(extracted_chunk_data.entities)
-                if extracted_chunk_data and extracted_chunk_data.relations:
-                    all_relations.extend(extracted_chunk_data.relations)
-            except Exception as e:
-                print(f"    - Warning: Could not process chunk {i+1} for graph extraction. Error: {e}")
-                # Continue to the next chunk
-                continue
+        results = _batch_cached("graph", graph_chain, chunks)
         
         print("All chunks processed. De-duplicating results...")
         
-        # 4. De-duplicate and merge results robustly
-        unique_entities_dict = {e.name: e for e in reversed(all_entities)}
-        for r in all_relations:
-            if r.source not in unique_entities_dict:
-                unique_entities_dict[r.source] = Entity(name=r.source, type='Concept')
-            if r.target not in unique_entities_dict:
-                unique_entities_dict[r.target] = Entity(name=r.target, type='Concept')
-        
-        unique_relations = {}
-        for r in all_relations:
-            relation_key = (r.source, r.target, r.type)
-            if r.source in unique_entities_dict and r.target in unique_entities_dict:
-                unique_relations[relation_key] = r
-
-        final_entities = [e.dict() for e in unique_entities_dict.values()]
-        final_relations = [r.dict() for r in unique_relations.values()]
+        # 3. De-duplicate and merge results robustly
+        merger = _GraphMerger()
+        for i, result in enumerate(results):
+            merger.add(i, result)
+        graph = merger.result()
         
         print("De-duplication complete.")
-        return {"entities": final_entities, "relations": final_relations}
+        return graph
 
     except Exception as e:
         print(f"An unexpected error occurred in process_paper_content: {e}")
-        return {
-            "entities": [{"name": "Error", "type": "Processing Failed"}],
-            "relations": [{"source": "Document Processing", "target": "Error", "type": "ENCOUNTERED"}]
-        }
+        return _error_graph()
+
+
+async def aprocess_paper_content(content: str) -> Dict[str, List[Any]]:
+    """Async variant of `process_paper_content`, for running alongside the other analyses."""
+    try:
+        chunks = split_into_chunks(content)
+
+        # Map: extract every chunk concurrently, bounded to stay clear of rate limits.
+        # Reduce: merge each chunk's graph as soon as it arrives, while others are in flight
+        print(f"Processing {len(chunks)} chunks for graph extraction...")
+        merger = _GraphMerger()
+        async for i, result in _abatch_cached_as_completed("graph", graph_chain, chunks):
+            merger.add(i, result)
+
+        print("All chunks processed.")
+        graph = merger.result()
+        print("De-duplication complete.")
+        return graph
+
+    except Exception as e:
+        print(f"An unexpected error occurred in aprocess_paper_content: {e}")
+        return _error_graph()
 
 # --- TEXTUAL ANALYSIS GENERATION ---
 
 str_parser = StrOutputParser()
 
-# --- Key Topics and Methodologies ---
-key_topics_prompt = ChatPromptTemplate.from_template(
-    """You are an expert at analyzing scientific papers. 
-    Analyze the following text and identify the most important topics and the key methodologies associated with them.
-    Present your findings as a list of topics, each with a brief explanation of its methodology. 
-    Use Markdown for formatting, including headers and bullet points.
+# Key topics, hypotheses and future work are generated in a single call, so the
+# paper is sent once instead of three times. Each part comes back as its own
+# level-2 section and is split out by header.
+analysis_prompt = ChatPromptTemplate.from_template(
+    """You are an expert research assistant and a critical reviewer of scientific work.
+    Analyze the following research paper and write exactly three sections, in this order,
+    each starting with the level-2 Markdown header shown:
+
+    ## Key Topics and Methodologies
+    The most important topics, each with a brief explanation of the key methodology associated with it.
+
+    ## Hypotheses and Research Ideas
+    Novel, testable hypotheses and broader research ideas, based on identified gaps, contradictions,
+    or logical next steps from the paper's findings. Frame them as clear, concise points.
+
+    ## Future Work
+    Concrete directions for future work. What are the limitations of the current study?
+    What are the next logical experiments or theoretical developments?
+
+    Inside each section use Markdown bullet points, and only level-3 (###) or lower headers.
 
     Text to analyze:
     {text}
     """
 )
 
-def generate_key_topics(content: str) -> str:
-    """Generates a summary of key topics and methodologies from the text."""
+analysis_chain = analysis_prompt | llm | str_parser
+
+# Keyword identifying each section's header in the combined response
+ANALYSIS_SECTIONS = {
+    "key_topics": "topic",
+    "hypotheses": "hypothes",
+    "future_work": "future",
+}
+
+def split_analysis_sections(markdown: str) -> Dict[str, str]:
+    """Splits the combined analysis response into its three sections."""
+    sections = {key: [] for key in ANALYSIS_SECTIONS}
+    current = None
+    for line in markdown.splitlines(keepends=True):
+        if line.startswith("## "):
+            heading = line[3:].lower()
+            matched = next((key for key, keyword in ANALYSIS_SECTIONS.items() if keyword in heading), None)
+            if matched:
+                current = matched
+                continue
+        if current:
+            sections[current].append(line)
+
+    if current is None:
+        # The model ignored the section headers; keep the response rather than drop it
+        return {"key_topics": markdown.strip(), "hypotheses": "", "future_work": ""}
+    return {key: "".join(lines).strip() for key, lines in sections.items()}
+
+def analysis_error(e: Exception) -> Dict[str, str]:
+    """Analysis shaped like `analyze_paper`'s result, reporting `e` in every section."""
+    return {key: f"Error generating analysis: {e}" for key in ANALYSIS_SECTIONS}
+
+def analyze_paper(content: str) -> Dict[str, str]:
+    """
+    Generates key topics and methodologies, hypotheses and research ideas, and
+    future work suggestions in one LLM call. Returns a dict keyed by
+    'key_topics', 'hypotheses' and 'future_work' holding Markdown.
+    """
     try:
-        chain = key_topics_prompt | llm | str_parser
-        return chain.invoke({"text": content})
+        return split_analysis_sections(_invoke_cached("analysis", analysis_chain, content))
     except Exception as e:
-        return f"Error generating key topics: {e}"
+        return analysis_error(e)
 
-# --- Hypotheses and Ideas ---
-hypotheses_prompt = ChatPromptTemplate.from_template(
-    """You are a creative and insightful research assistant. 
-    Based on the following research paper, generate a list of novel, testable hypotheses and broader research ideas.
-    These could be based on identified gaps, contradictions, or logical next steps from the paper's findings. 
-    Frame them as clear, concise points. Use Markdown for formatting, including headers and bullet points.
+async def aanalyze_paper(content: str) -> Dict[str, str]:
+    """Async variant of `analyze_paper`."""
+    try:
+        return split_analysis_sections(await _ainvoke_cached("analysis", analysis_chain, content))
+    except Exception as e:
+        return analysis_error(e)
 
-    Text to analyze:
-    {text}
+# Longest a partial line of the streamed analysis waits before it is rendered
+ANALYSIS_RENDER_INTERVAL = 0.25
+
+def _render_due(part: str, last_render: float) -> bool:
+    """True once `part` completes a line, or ANALYSIS_RENDER_INTERVAL has passed since the last render."""
+    return "\n" in part or time.monotonic() - last_render >= ANALYSIS_RENDER_INTERVAL
+
+def stream_analysis(content: str) -> Iterator[Dict[str, str]]:
     """
-)
+    Streaming variant of `analyze_paper`. Yields the sections parsed so far as
+    tokens arrive, so they can be rendered before the response is complete; the
+    last value yielded is the full analysis. The response is only re-parsed when
+    a line completes or ANALYSIS_RENDER_INTERVAL has passed, not on every token.
+    """
+    markdown, last_render, pending = "", 0.0, False
+    try:
+        for part in _stream_cached("analysis", analysis_chain, content):
+            markdown += part
+            pending = True
+            if _render_due(part, last_render):
+                last_render, pending = time.monotonic(), False
+                yield split_analysis_sections(markdown)
+        if pending:
+            yield split_analysis_sections(markdown)
+    except Exception as e:
+        yield analysis_error(e)
 
-def generate_hypotheses(content: str) -> str:
-    """Generates novel hypotheses and research ideas from the text."""
+async def astream_analysis(content: str) -> AsyncIterator[Dict[str, str]]:
+    """Async variant of `stream_analysis`."""
+    markdown, last_render, pending = "", 0.0, False
     try:
-        chain = hypotheses_prompt | llm | str_parser
-        return chain.invoke({"text": content})
+        async for part in _astream_cached("analysis", analysis_chain, content):
+            markdown += part
+            pending = True
+            if _render_due(part, last_render):
+                last_render, pending = time.monotonic(), False
+                yield split_analysis_sections(markdown)
+        if pending:
+            yield split_analysis_sections(markdown)
     except Exception as e:
-        return f"Error generating hypotheses: {e}"
+        yield analysis_error(e)
 
-# --- Future Work ---
-future_work_prompt = ChatPromptTemplate.from_template(
-    """You are a critical reviewer of scientific work. 
-    Analyze the provided research paper and suggest concrete directions for future work. 
-    What are the limitations of the current study? What are the next logical experiments or theoretical developments? 
-    Present your answer as a list of suggestions. Use Markdown for formatting, including headers and bullet points.
+# Kept for existing callers; after the first call these are served from the response cache.
 
-    Text to analyze:
-    {text}
-    """
-)
+def generate_key_topics(content: str) -> str:
+    """Generates a summary of key topics and methodologies from the text."""
+    return analyze_paper(content)["key_topics"]
+
+def generate_hypotheses(content: str) -> str:
+    """Generates novel hypotheses and research ideas from the text."""
+    return analyze_paper(content)["hypotheses"]
 
 def generate_future_work(content: str) -> str:
     """Generates suggestions for future work based on the text."""
-    try:
-        chain = future_work_prompt | llm | str_parser
-        return chain.invoke({"text": content})
-    except Exception as e:
-        return f"Error generating future work suggestions: {e}"
+    return analyze_paper(content)["future_work"]
 
+# --- CONCURRENT ANALYSIS ---
+
+async def arun_analyses(content: str):
+    """
+    Runs the graph extraction and the textual analysis concurrently.
+    Returns (graph_data, analysis) where analysis is the dict from `analyze_paper`.
+    Closes the running loop's connections when done, so it is safe to call via `asyncio.run`.
+    """
+    try:
+        return await asyncio.gather(aprocess_paper_content(content), aanalyze_paper(content))
+    finally:
+        await aclose_http_clients()
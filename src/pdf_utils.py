@@ -0,0 +1,82 @@
+# src/pdf_utils.py
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+# pdfium is not thread-safe, so large documents are split across processes instead.
+# Below this many pages per worker, process start-up costs more than it saves.
+MIN_PAGES_PER_WORKER = 32
+
+# Page objects that may carry extractable text
+_TEXT_OBJECT_TYPES = (pdfium_c.FPDF_PAGEOBJ_TEXT, pdfium_c.FPDF_PAGEOBJ_FORM)
+
+
+def _extract_page_text(pdf: pdfium.PdfDocument, index: int) -> Optional[str]:
+    """Returns the page text, or None for pages without any text objects (e.g. scans)."""
+    page = pdf[index]
+    try:
+        # Building a text page is the expensive part; image-only pages have nothing to find.
+        # Form XObjects can nest text deeper than get_objects descends, so any page with
+        # one is treated as having text.
+        if next(page.get_objects(filter=_TEXT_OBJECT_TYPES, max_depth=1), None) is None:
+            return None
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+    finally:
+        page.close()
+
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> List[Optional[str]]:
+    """Worker entry point: reopens the document and extracts pages [start, stop)."""
+    pdf = pdfium.PdfDocument(data)
+    try:
+        return [_extract_page_text(pdf, i) for i in range(start, stop)]
+    finally:
+        pdf.close()
+
+
+def _join_pages(page_texts: List[Optional[str]]) -> Tuple[str, int, int]:
+    extracted = [text for text in page_texts if text is not None]
+    return "\n".join(extracted), len(page_texts), len(page_texts) - len(extracted)
+
+
+def extract_pdf_text(source: Union[bytes, BinaryIO]) -> Tuple[str, int, int]:
+    """
+    Extracts the text of every page of a PDF using pdfium, which is much faster
+    than pure-Python parsers on real-world papers. `source` may be bytes or a
+    seekable binary file, which pdfium then reads directly without a copy.
+    Large documents are extracted in parallel, one contiguous page range per
+    worker process. Pages without any text objects, such as scanned figures, are
+    skipped. Returns (text, num_pages, skipped_pages).
+    """
+    pdf = pdfium.PdfDocument(source)
+    try:
+        num_pages = len(pdf)
+        workers = min(os.cpu_count() or 1, num_pages // MIN_PAGES_PER_WORKER)
+        if workers <= 1:
+            return _join_pages([_extract_page_text(pdf, i) for i in range(num_pages)])
+    finally:
+        pdf.close()
+
+    if isinstance(source, bytes):
+        data = source
+    else:
+        # Workers need their own copy of the document anyway, so read it once here
+        source.seek(0)
+        data = source.read()
+
+    bounds = [num_pages * i // workers for i in range(workers + 1)]
+    # Spawn rather than fork: the Streamlit server process is multi-threaded
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        page_ranges = executor.map(
+            _extract_page_range, [data] * workers, bounds[:-1], bounds[1:]
+        )
+        page_texts = [text for page_range in page_ranges for text in page_range]
+    return _join_pages(page_texts)
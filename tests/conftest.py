@@ -0,0 +1,4 @@
+import os
+
+# genai_core reads the key at import time; these tests never call the API
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
@@ -0,0 +1,85 @@
+import pytest
+
+from src.genai_core import (
+    InvalidExtractionError,
+    _drop_near_duplicates,
+    _GraphMerger,
+    parse_extraction,
+    split_analysis_sections,
+)
+
+GRAPH_JSON = '{"entities": [{"name": "BERT", "type": "Method"}], "relations": [{"source": "BERT", "target": "NLP", "type": "APPLIES_TO"}]}'
+GRAPH = {
+    "entities": [{"name": "BERT", "type": "Method"}],
+    "relations": [{"source": "BERT", "target": "NLP", "type": "APPLIES_TO"}],
+}
+
+
+def test_parse_extraction_plain_json():
+    assert parse_extraction(GRAPH_JSON) == GRAPH
+
+
+def test_parse_extraction_fenced_json():
+    assert parse_extraction(f"```json\n{GRAPH_JSON}\n```") == GRAPH
+
+
+def test_parse_extraction_json_in_prose():
+    assert parse_extraction(f"Here is the graph: {GRAPH_JSON} Let me know if you need more.") == GRAPH
+
+
+@pytest.mark.parametrize("text", [None, "", "I cannot help with that.", "[]", '{"entities": []}'])
+def test_parse_extraction_rejects_non_extractions(text):
+    with pytest.raises(InvalidExtractionError):
+        parse_extraction(text)
+
+
+def test_parse_extraction_rejects_malformed_items():
+    with pytest.raises(InvalidExtractionError):
+        parse_extraction('{"entities": [{"name": "BERT"}], "relations": []}')
+    with pytest.raises(InvalidExtractionError):
+        parse_extraction('{"entities": [], "relations": [{"source": "A", "target": 1, "type": "USES"}]}')
+
+
+def test_graph_merger_skips_failed_chunks_and_malformed_items():
+    merger = _GraphMerger()
+    merger.add(0, ValueError("boom"))
+    merger.add(1, "not a graph")
+    merger.add(2, {
+        "entities": [{"name": "A", "type": "Concept"}, {"name": "B"}, "C"],
+        "relations": [{"source": "A", "target": "B", "type": "USES"}, {"source": "A"}],
+    })
+    assert merger.result() == {
+        "entities": [{"name": "A", "type": "Concept"}, {"name": "B", "type": "Concept"}],
+        "relations": [{"source": "A", "target": "B", "type": "USES"}],
+    }
+
+
+def test_graph_merger_keeps_type_from_earliest_chunk():
+    merger = _GraphMerger()
+    merger.add(1, {"entities": [{"name": "A", "type": "Method"}], "relations": []})
+    merger.add(0, {"entities": [{"name": "A", "type": "Concept"}], "relations": []})
+    assert merger.result()["entities"] == [{"name": "A", "type": "Concept"}]
+
+
+def test_split_analysis_sections():
+    markdown = (
+        "Intro line\n"
+        "## Key Topics and Methodologies\n- topic\n### Detail\n- more\n"
+        "## Hypotheses and Research Ideas\n- idea\n"
+        "## Future Work\n- next step\n"
+    )
+    assert split_analysis_sections(markdown) == {
+        "key_topics": "- topic\n### Detail\n- more",
+        "hypotheses": "- idea",
+        "future_work": "- next step",
+    }
+
+
+def test_split_analysis_sections_without_headers_keeps_response():
+    assert split_analysis_sections("Just text.\n") == {"key_topics": "Just text.", "hypotheses": "", "future_work": ""}
+
+
+def test_drop_near_duplicates_keeps_distinct_chunks():
+    chunk = " ".join(f"word{i}" for i in range(300))
+    other = " ".join(f"term{i}" for i in range(300))
+    assert _drop_near_duplicates([chunk, other, chunk.upper() + "  ", chunk]) == [chunk, other]